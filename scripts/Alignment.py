@@ -10,6 +10,7 @@ Steps :
 2. Parse RTTM Files: Extracts speaker information, start time, and duration from diarization results.
 3. Align Dialogues: Maps PDF dialogues to diarized speaker segments and saves the aligned data in JSON format.
 4. Process All Files: Iterates through all RTTM and PDF files in the specified folders.
+   (For many cases use `batch_alignment.py`, which aligns cases in parallel into one consolidated segment index.)
 
 Preprocessing Steps :
 1. Expand Contractions: Replaces contractions like "don't" with "do not" using `expand_contractions`.
@@ -163,10 +164,7 @@ def parse_rttm(rttm_path):
     return speaker_segments
 
 # Step 7: Align the extracted dialogues with diarization and map speaker names
-def align_dialogues_with_diarization(diarization_path, pdf_path, output_json_path):
-    dialogues = extract_dialogues_from_pdf(pdf_path)
-    speaker_segments = parse_rttm(diarization_path)
-
+def align_dialogues(dialogues, speaker_segments):
     result = []
     dialogue_index = 0  # Track which dialogue we are aligning
 
@@ -199,6 +197,13 @@ def align_dialogues_with_diarization(diarization_path, pdf_path, output_json_pat
             })
             dialogue_index += 1  
 
+    return result
+
+def align_dialogues_with_diarization(diarization_path, pdf_path, output_json_path):
+    dialogues = extract_dialogues_from_pdf(pdf_path)
+    speaker_segments = parse_rttm(diarization_path)
+    result = align_dialogues(dialogues, speaker_segments)
+
     # Save the aligned data to JSON
     with open(output_json_path, "w") as output_file:
         json.dump(result, output_file, indent=4)
@@ -224,9 +229,10 @@ def process_all_files(rttm_folder, pdf_folder, output_json_folder):
             else:
                 print(f"Warning: PDF for {case_name} not found!")
 
-rttm_folder = 'output_diarization_folder'  
-pdf_folder = 'pdf_transcripts'    
-output_json_folder = 'final_output_json'  
+if __name__ == "__main__":
+    rttm_folder = 'output_diarization_folder'  
+    pdf_folder = 'pdf_transcripts'    
+    output_json_folder = 'final_output_json'  
 
-process_all_files(rttm_folder, pdf_folder, output_json_folder)
-print("All files processed and aligned!")
+    process_all_files(rttm_folder, pdf_folder, output_json_folder)
+    print("All files processed and aligned!")
@@ -0,0 +1,225 @@
+############################################################################################################################
+############################################################################################################################
+'''
+Purpose : Align many cases in parallel (PDF transcript + RTTM diarization, see Alignment.py) and stream the aligned segments
+          into one consolidated, append-only segment index, instead of writing and re-reading one indented JSON per case.
+
+Steps :
+
+1. Find Cases: Pairs every RTTM file with the PDF transcript of the same name and fingerprints both (size, modification time).
+2. Parallel Alignment: Uses `ProcessPoolExecutor` to align the new or changed cases across multiple CPU cores. Unchanged
+   cases are skipped.
+3. Segment Index: Each finished case is appended to the segments file (one JSON line per segment) as soon as it is done,
+   and `index.json` records the byte offset, length and number of segments of every case, so a case can be read back with
+   one seek. Re-running only appends the changed cases and points the index at their new records, the stale bytes are
+   dropped by `compact_segment_index` once they outgrow the live records. Compaction writes a new generation of the
+   segments file and switches to it by saving the index, so an interruption at any point leaves a consistent index.
+4. Summary: Prints one table with the alignment coverage (aligned dialogues / PDF dialogues, aligned segments / diarized
+   segments) and the aligned and diarized duration of every case. A case that fails to align (bad PDF or RTTM) is listed
+   as failed and does not stop the batch, its previous index entry (if any) is kept and it is retried on the next run.
+
+Index Folder Layout :
+
+segments.<generation>.jsonl = aligned segments of all cases, one JSON object per line (same fields as the Alignment.py
+                              JSON + "case"), the generation goes up by one on every compaction
+index.json = {"segments_file": current segments file name,
+              "cases": {case_name: {"offset", "length", "num_segments", "fingerprint", "stats"}}}
+
+Replace Paths :
+
+rttm_folder = "path_to_rttm_files"
+pdf_folder = "path_to_pdf_files"
+index_folder = "path_to_save_segment_index"
+
+To know how many CPU cores you have, run this command - "sysctl -n hw.ncpu" and the adjust the parameter num_workers based on that
+'''
+############################################################################################################################
+############################################################################################################################
+
+
+import os
+import json
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from Alignment import extract_dialogues_from_pdf, parse_rttm, align_dialogues
+
+INDEX_FILE = "index.json"
+
+def segments_file_name(generation):
+    return f"segments.{generation}.jsonl"
+
+def file_fingerprint(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime]
+
+# Pair every RTTM file with its PDF transcript, returns {case_name: (rttm_path, pdf_path)}
+def find_cases(rttm_folder, pdf_folder):
+    cases = {}
+    for rttm_file in sorted(os.listdir(rttm_folder)):
+        if rttm_file.endswith(".rttm"):
+            case_name = rttm_file.replace(".rttm", "")
+            pdf_path = os.path.join(pdf_folder, case_name + ".pdf")
+            if os.path.exists(pdf_path):
+                cases[case_name] = (os.path.join(rttm_folder, rttm_file), pdf_path)
+            else:
+                print(f"Warning: PDF for {case_name} not found!")
+    return cases
+
+# Runs in a worker process: align one case and compute its coverage and duration stats
+def align_case(case_name, rttm_path, pdf_path):
+    dialogues = extract_dialogues_from_pdf(pdf_path)
+    speaker_segments = parse_rttm(rttm_path)
+    segments = align_dialogues(dialogues, speaker_segments)
+
+    stats = {
+        "dialogues": len(dialogues),
+        "diarized_segments": len(speaker_segments),
+        "aligned_segments": len(segments),
+        "dialogue_coverage": len(segments) / len(dialogues) if dialogues else 0.0,
+        "diarization_coverage": len(segments) / len(speaker_segments) if speaker_segments else 0.0,
+        "aligned_seconds": sum(segment["end_time"] - segment["start_time"] for segment in segments),
+        "diarized_seconds": sum(segment["end_time"] - segment["start_time"] for segment in speaker_segments)
+    }
+    return case_name, segments, stats
+
+def load_segment_index(index_folder):
+    index_path = os.path.join(index_folder, INDEX_FILE)
+    if os.path.exists(index_path):
+        with open(index_path, "r") as f:
+            return json.load(f)
+    return {"segments_file": segments_file_name(0), "cases": {}}
+
+# Write to a temporary file first so an interrupted run never leaves a half written index. Saving the index is also
+# the single step that switches to a new segments file after compaction
+def save_segment_index(index_folder, index):
+    index_path = os.path.join(index_folder, INDEX_FILE)
+    with open(index_path + ".tmp", "w") as f:
+        json.dump(index, f)
+    os.replace(index_path + ".tmp", index_path)
+
+def load_case_segments(index_folder, case_name, index=None):
+    """Reads the aligned segments of one case from the segment index with a single seek."""
+    if index is None:
+        index = load_segment_index(index_folder)
+    entry = index["cases"][case_name]
+    with open(os.path.join(index_folder, index["segments_file"]), "rb") as f:
+        f.seek(entry["offset"])
+        lines = f.read(entry["length"]).decode("utf-8").splitlines()
+    return [json.loads(line) for line in lines]
+
+def iter_cases(index_folder):
+    """Yields (case_name, segments) for every case in the segment index."""
+    index = load_segment_index(index_folder)
+    for case_name in sorted(index["cases"]):
+        yield case_name, load_case_segments(index_folder, case_name, index)
+
+def compact_segment_index(index_folder):
+    """Copies the live records into the next generation of the segments file, without the records of replaced cases."""
+    index = load_segment_index(index_folder)
+    old_file = index["segments_file"]
+    generation = int(old_file.split(".")[1]) + 1
+    new_file = segments_file_name(generation)
+
+    with open(os.path.join(index_folder, old_file), "rb") as source, \
+            open(os.path.join(index_folder, new_file), "wb") as target:
+        for case_name in sorted(index["cases"]):
+            entry = index["cases"][case_name]
+            source.seek(entry["offset"])
+            entry["offset"] = target.tell()
+            target.write(source.read(entry["length"]))
+        target.flush()
+        os.fsync(target.fileno())
+
+    # Until the index is saved it still points at the old, untouched file
+    index["segments_file"] = new_file
+    save_segment_index(index_folder, index)
+
+    # Only now are older generations unreferenced (including leftovers of an earlier interrupted compaction)
+    for f in os.listdir(index_folder):
+        if f.startswith("segments.") and f.endswith(".jsonl") and f != new_file:
+            os.remove(os.path.join(index_folder, f))
+
+def print_alignment_summary(index, failed=None):
+    cases = index["cases"]
+    print(f"{'case':<80} {'segments':>8} {'dialogue cov':>12} {'diar cov':>8} {'aligned s':>10} {'diarized s':>10}")
+    for case_name in sorted(cases):
+        stats = cases[case_name]["stats"]
+        print(f"{case_name[:80]:<80} {stats['aligned_segments']:>8} {stats['dialogue_coverage']:>12.1%} "
+              f"{stats['diarization_coverage']:>8.1%} {stats['aligned_seconds']:>10.1f} {stats['diarized_seconds']:>10.1f}")
+    total_aligned = sum(entry["stats"]["aligned_seconds"] for entry in cases.values())
+    total_diarized = sum(entry["stats"]["diarized_seconds"] for entry in cases.values())
+    total_segments = sum(entry["stats"]["aligned_segments"] for entry in cases.values())
+    print(f"{len(cases)} cases, {total_segments} segments, {total_aligned / 3600:.2f} h aligned of {total_diarized / 3600:.2f} h diarized")
+    for case_name, error in sorted((failed or {}).items()):
+        print(f"FAILED {case_name}: {error}")
+
+def batch_align(rttm_folder, pdf_folder, index_folder, num_workers=4, save_every=20):
+    """Aligns new or changed cases in parallel and appends them to the consolidated segment index."""
+    if not os.path.exists(index_folder):
+        os.makedirs(index_folder)
+
+    cases = find_cases(rttm_folder, pdf_folder)
+    index = load_segment_index(index_folder)
+    indexed_cases = index["cases"]
+
+    # Cases whose RTTM or PDF disappeared are dropped from the index
+    for case_name in list(indexed_cases):
+        if case_name not in cases:
+            del indexed_cases[case_name]
+
+    fingerprints = {case_name: [file_fingerprint(rttm_path), file_fingerprint(pdf_path)]
+                    for case_name, (rttm_path, pdf_path) in cases.items()}
+    changed = [case_name for case_name in cases
+               if case_name not in indexed_cases or indexed_cases[case_name]["fingerprint"] != fingerprints[case_name]]
+    print(f"Aligning {len(changed)} new or changed cases, {len(cases) - len(changed)} unchanged")
+
+    with ProcessPoolExecutor(max_workers=num_workers) as executor, \
+            open(os.path.join(index_folder, index["segments_file"]), "ab") as segments_file:
+        futures = {executor.submit(align_case, case_name, *cases[case_name]): case_name for case_name in changed}
+        failed = {}
+
+        # Stream every case into the segment index as soon as its worker finishes
+        for done, future in enumerate(as_completed(futures), start=1):
+            try:
+                case_name, segments, stats = future.result()
+            except Exception as e:
+                failed[futures[future]] = f"{type(e).__name__}: {e}"
+                print(f"Failed to align {futures[future]}: {failed[futures[future]]}")
+                continue
+
+            records = b"".join((json.dumps({"case": case_name, **segment}) + "\n").encode("utf-8") for segment in segments)
+            offset = segments_file.tell()
+            segments_file.write(records)
+            segments_file.flush()
+
+            indexed_cases[case_name] = {
+                "offset": offset,
+                "length": len(records),
+                "num_segments": len(segments),
+                "fingerprint": fingerprints[case_name],
+                "stats": stats
+            }
+            print(f"Aligned {case_name}: {len(segments)} segments")
+
+            # The segments are already on disk, the index only needs saving every few cases to survive an interruption
+            if done % save_every == 0:
+                save_segment_index(index_folder, index)
+
+    save_segment_index(index_folder, index)
+
+    # Compact once replaced records take up more space than the live ones
+    live_bytes = sum(entry["length"] for entry in index["cases"].values())
+    if os.path.getsize(os.path.join(index_folder, index["segments_file"])) > 2 * live_bytes:
+        compact_segment_index(index_folder)
+        index = load_segment_index(index_folder)
+
+    print_alignment_summary(index, failed)
+    return index
+
+
+if __name__ == "__main__":
+    rttm_folder = 'output_diarization_folder'
+    pdf_folder = 'pdf_transcripts'
+    index_folder = 'segment_index'
+
+    batch_align(rttm_folder, pdf_folder, index_folder, num_workers=4)
+    print("All files processed and aligned!")
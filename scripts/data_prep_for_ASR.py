@@ -10,6 +10,13 @@ Steps :
 2. Create Transcript Files: Saves each transcript segment in a separate text file corresponding to the audio segment.
 3. Generate Metadata: Creates a metadata file containing information about the audio segments, transcripts, and speakers.
 
+With shape_segments=True the aligned turns are first shaped for Whisper's 30 s window (see segment_shaping.py): short
+same-speaker turns are merged and over-long turns are split at low-energy points, and the padding report is printed
+before and after shaping.
+
+With index_folder set, the aligned segments are read from the consolidated segment index written by batch_alignment.py
+instead of listing and loading one JSON file per case.
+
 Replace Paths : 
 
 json_folder = "path_to_json_files"
@@ -26,57 +33,82 @@ Date: 25th Sept, 2024
 import os
 import json
 import subprocess
+from pydub import AudioSegment
+from segment_shaping import shape_segments as shape_case_segments, padding_report, print_padding_report
 
 def split_audio(audio_file, start_time, end_time, output_file):
     """Splits audio file based on start and end times using ffmpeg."""
     command = ['ffmpeg', '-i', audio_file, '-ss', str(start_time), '-to', str(end_time), '-c', 'copy', output_file]
     subprocess.run(command)
 
-def prepare_asr_data(json_folder, audio_folder, output_folder):
-    """Prepares ASR dataset from aligned JSON files and audio files."""
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
-
-    metadata = []
+# Yields (case_name, aligned segments) from the segment index if given, else from the per case JSON files
+def load_aligned_cases(json_folder, index_folder=None):
+    if index_folder is not None:
+        # Imported here so the per case JSON path does not need the PDF alignment dependencies
+        from batch_alignment import iter_cases
+        yield from iter_cases(index_folder)
+        return
 
     for json_file in os.listdir(json_folder):
         if json_file.endswith(".json"):
-            base_name = json_file.replace(".json", "")
-            audio_file = os.path.join(audio_folder, base_name + ".wav")
-            
             # Loading the JSON file
             json_path = os.path.join(json_folder, json_file)
             with open(json_path, 'r') as f:
-                aligned_data = json.load(f)
-
-            for idx, segment in enumerate(aligned_data):
-                start_time = segment["start_time"]
-                end_time = segment["end_time"]
-                transcript = segment["transcript"]
+                yield json_file.replace(".json", ""), json.load(f)
 
-                # Create file names for the audio segment and transcript
-                audio_output = os.path.join(output_folder, f"{base_name}_segment_{idx}.wav")
-                transcript_output = os.path.join(output_folder, f"{base_name}_segment_{idx}.txt")
-
-                # Split the audio
-                split_audio(audio_file, start_time, end_time, audio_output)
-
-                # Write the transcript
-                with open(transcript_output, 'w') as transcript_file:
-                    transcript_file.write(transcript)
+def prepare_asr_data(json_folder, audio_folder, output_folder, shape_segments=True, target_duration=25.0, max_duration=30.0,
+                     index_folder=None):
+    """Prepares ASR dataset from aligned JSON files (or the batch alignment segment index) and audio files."""
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
 
-                # Append to metadata
-                metadata.append({
-                    "audio": audio_output,
-                    "transcript": transcript_output,
-                    "speaker": segment["real_speaker"]
-                })
+    metadata = []
+    segments_before = []
+    segments_after = []
+
+    for base_name, aligned_data in load_aligned_cases(json_folder, index_folder):
+        audio_file = os.path.join(audio_folder, base_name + ".wav")
+
+        if shape_segments:
+            segments_before.extend(aligned_data)
+            # The recording is only decoded if a turn is long enough to need splitting
+            aligned_data = shape_case_segments(aligned_data, lambda: AudioSegment.from_wav(audio_file), target_duration, max_duration)
+            segments_after.extend(aligned_data)
+
+        for idx, segment in enumerate(aligned_data):
+            start_time = segment["start_time"]
+            end_time = segment["end_time"]
+            transcript = segment["transcript"]
+
+            # Create file names for the audio segment and transcript
+            audio_output = os.path.join(output_folder, f"{base_name}_segment_{idx}.wav")
+            transcript_output = os.path.join(output_folder, f"{base_name}_segment_{idx}.txt")
+
+            # Split the audio
+            split_audio(audio_file, start_time, end_time, audio_output)
+
+            # Write the transcript
+            with open(transcript_output, 'w') as transcript_file:
+                transcript_file.write(transcript)
+
+            # Append to metadata
+            metadata.append({
+                "audio": audio_output,
+                "transcript": transcript_output,
+                "speaker": segment["real_speaker"],
+                # Pieces of split turns have approximate text/audio boundaries, kept so they can be filtered out
+                "split": segment.get("split", False)
+            })
 
     # Save metadata to a JSON 
     metadata_file = os.path.join(output_folder, 'metadata.json')
     with open(metadata_file, 'w') as mf:
         json.dump(metadata, mf, indent=4)
 
+    if shape_segments:
+        print_padding_report("Before shaping", padding_report(segments_before))
+        print_padding_report("After shaping", padding_report(segments_after))
+
 json_folder = 'final_output_json'
 audio_folder = 'original_audio_folder'
 output_folder = 'ASR_data'
@@ -8,14 +8,36 @@ Steps :
 1. Load the Model & Processor: Initializes the pre-trained Whisper model and its processor for handling audio and text.
 2. Data Preparation: Reads audio and transcript files from a local directory, processes audio into Log-Mel spectrograms, 
    and converts transcripts into token IDs.
+   If the folder has the `metadata.json` written by data_prep_for_ASR.py, audio and transcripts are paired through it and
+   pieces of split turns ("split": true) are skipped unless skip_split_segments = False.
 3. Apply LoRA Fine-Tuning: Customizes the model with LoRA parameters for resource-efficient fine-tuning.
-4. Training & Evaluation: Fine-tunes the model on provided data and evaluates using Word Error Rate (WER).
+4. Training & Evaluation: Fine-tunes the model on provided data and evaluates using Word Error Rate (WER) and Character Error Rate (CER).
 5. Checkpointing: Saves model checkpoints during training for future reference.
 
+Fast Start Mode (fast_start = True) :
+1. Base model and processor are loaded from a local snapshot of `openai/whisper-small` at a pinned commit, kept in its own
+   folder per commit (`whisper-small-<commit>`), so the hub is never re-resolved and changing `whisper_revision` downloads
+   the new revision instead of silently loading the old one. A branch name or short hash (or `None`, meaning `main`) is
+   resolved to the full commit once, on the first download, and the mapping is recorded in
+   `whisper-small_pinned_revisions.json`. A snapshot only counts as present once its download finished (`.complete`
+   marker), an interrupted download is resumed on the next run. Weights are read from safetensors (memory mapped) with
+   `low_cpu_mem_usage` so they are loaded lazily.
+2. The featurized dataset (log-mel spectrograms + token ids) is saved to disk once and memory mapped on later runs, it is only
+   rebuilt when the audio/transcript files or the pinned revision change.
+3. With `resume_training = True` training resumes from the last checkpoint, but only when the cached features were reused
+   (same data and revision). Checkpoints already hold only the LoRA adapter, as the Trainer saves a PEFT model through
+   `save_pretrained`; most of a checkpoint is the Adam optimizer state (two tensors per adapter weight), the scheduler,
+   RNG and training_args files are small.
+4. Time to first training step (timed from before the torch/transformers imports) and size of every checkpoint are printed,
+   run once with fast_start = False to compare against the original path.
+
 Replace Paths : 
 
 audio_folder = "path_to_your_audio_folder"
 transcript_folder = "path_to_your_transcripts_folder"
+whisper_snapshot_root = "path_to_folder_for_local_whisper_snapshots"
+features_cache_folder = "path_to_save_featurized_dataset"
+whisper_revision = "commit hash of openai/whisper-small to pin"
 
 
 Code written by: Guneesh Vats
@@ -25,15 +47,22 @@ Date: 25th Sept, 2024
 ############################################################################################################################
 
 
-from transformers import WhisperForConditionalGeneration, WhisperProcessor, Seq2SeqTrainer, Seq2SeqTrainingArguments
+# Started before the heavy imports so the time to first step includes the torch/transformers import cost
+import time
+script_start_time = time.perf_counter()
+
+from transformers import WhisperForConditionalGeneration, WhisperProcessor, Seq2SeqTrainer, Seq2SeqTrainingArguments, TrainerCallback
+from transformers.trainer_utils import get_last_checkpoint
 from peft import PeftModelForSeq2SeqLM, get_peft_model, LoraConfig, TaskType
+from huggingface_hub import snapshot_download, HfApi
 import os
+import json
 import librosa
 import torch
-from evaluate import load
-from datasets import Dataset
+from datasets import Dataset, load_from_disk
 from torch.nn.utils.rnn import pad_sequence
 from sklearn.model_selection import train_test_split 
+from wer_evaluation import corpus_error_rates
 
 # Custom Data Collator for Whisper to handle spectrograms (input_features)
 class CustomDataCollator:
@@ -47,9 +76,85 @@ class CustomDataCollator:
         labels_padded = pad_sequence(labels, batch_first=True, padding_value=-100)  # Use -100 for ignored tokens in loss
         return {"input_features": input_features_padded, "labels": labels_padded}
 
+# Prints time to first training step and size of each saved checkpoint
+class StartupAndCheckpointCallback(TrainerCallback):
+    def __init__(self, start_time):
+        self.start_time = start_time
+        self.first_step_seconds = None
+
+    def on_step_begin(self, args, state, control, **kwargs):
+        if self.first_step_seconds is None:
+            self.first_step_seconds = time.perf_counter() - self.start_time
+            print(f"Time to first training step: {self.first_step_seconds:.1f}s")
+
+    def on_save(self, args, state, control, **kwargs):
+        checkpoint_dir = os.path.join(args.output_dir, f"checkpoint-{state.global_step}")
+        size = sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(checkpoint_dir) for f in files)
+        print(f"Saved {checkpoint_dir}: {size / 1e6:.1f} MB")
+
+# Download the pinned revision once into its own folder, later runs load straight from it without touching the hub.
+# Returns (local folder, commit hash)
+def ensure_local_snapshot(repo_id, revision, snapshot_root):
+    model_name = repo_id.split("/")[-1]
+    requested = revision or "main"
+
+    # Anything that is not a full commit hash (branch, tag, short hash) is resolved once and the mapping recorded
+    pinned_file = os.path.join(snapshot_root, f"{model_name}_pinned_revisions.json")
+    pinned = {}
+    if os.path.exists(pinned_file):
+        with open(pinned_file, 'r') as f:
+            pinned = json.load(f)
+    is_full_hash = len(requested) == 40 and all(c in "0123456789abcdef" for c in requested)
+    commit = requested if is_full_hash else pinned.get(requested)
+
+    # The marker is written only after snapshot_download returns, so an interrupted download is not mistaken for a snapshot
+    if commit is not None:
+        local_folder = os.path.join(snapshot_root, f"{model_name}-{commit}")
+        if os.path.exists(os.path.join(local_folder, ".complete")):
+            return local_folder, commit
+    else:
+        commit = HfApi().model_info(repo_id, revision=requested).sha
+
+    local_folder = os.path.join(snapshot_root, f"{model_name}-{commit}")
+    snapshot_download(repo_id, revision=commit, local_dir=local_folder,
+                      allow_patterns=["*.json", "*.safetensors", "*.txt", "*.model"])
+    open(os.path.join(local_folder, ".complete"), 'w').close()
+
+    if not is_full_hash and requested not in pinned:
+        pinned[requested] = commit
+        with open(pinned_file + ".tmp", 'w') as f:
+            json.dump(pinned, f, indent=4)
+        os.replace(pinned_file + ".tmp", pinned_file)
+        print(f"Pinned {repo_id} {requested} to commit {commit}, set whisper_revision = \"{commit}\" to keep it")
+    return local_folder, commit
+
+# Fingerprint of the data files (names, sizes, modification times) to know when the cached features are stale
+def data_fingerprint(audio_folder, transcript_folder):
+    entries = []
+    for folder, extension in ((audio_folder, '.wav'), (transcript_folder, '.txt')):
+        for f in sorted(os.listdir(folder)):
+            if f.endswith(extension):
+                stat = os.stat(os.path.join(folder, f))
+                entries.append([f, stat.st_size, stat.st_mtime])
+    return entries
+
+# Set fast_start = False to run the original startup path (for comparing time to first step and checkpoint size)
+fast_start = True
+resume_training = True
+# Commit hash of openai/whisper-small to train from; None pins whatever `main` resolves to on the first download
+whisper_revision = None
+whisper_snapshot_root = "../models/whisper"
+features_cache_folder = "../models/whisper/features_cache"
+
 # 1. Load Pre-trained Whisper Model
-model = WhisperForConditionalGeneration.from_pretrained("openai/whisper-small")
-processor = WhisperProcessor.from_pretrained("openai/whisper-small")
+if fast_start:
+    model_path, whisper_commit = ensure_local_snapshot("openai/whisper-small", whisper_revision, whisper_snapshot_root)
+    model = WhisperForConditionalGeneration.from_pretrained(model_path, local_files_only=True, use_safetensors=True,
+                                                            low_cpu_mem_usage=True)
+    processor = WhisperProcessor.from_pretrained(model_path, local_files_only=True)
+else:
+    model = WhisperForConditionalGeneration.from_pretrained("openai/whisper-small")
+    processor = WhisperProcessor.from_pretrained("openai/whisper-small")
 
 # Move model to GPU if available
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
@@ -78,19 +183,58 @@ transcript_folder = "/Users/guneeshvats/Desktop/Adalat AI assignment/Approach_2/
 audio_files = sorted([f for f in os.listdir(audio_folder) if f.endswith('.wav')])
 transcript_files = sorted([f for f in os.listdir(transcript_folder) if f.endswith('.txt')])
 
-data = []
-for audio_file, transcript_file in zip(audio_files, transcript_files):
-    audio_path = os.path.join(audio_folder, audio_file)
-    transcript_path = os.path.join(transcript_folder, transcript_file)
-    audio, sr = librosa.load(audio_path, sr=16000)
-    with open(transcript_path, 'r') as f:
-        transcript = f.read().strip()
-    input_features = processor(audio, sampling_rate=16000, return_tensors="pt").input_features.squeeze(0)
-    labels = processor.tokenizer(transcript, return_tensors="pt").input_ids.squeeze(0)
-    data.append({"input_features": input_features.numpy().tolist(), "labels": labels.numpy().tolist()})
+# Pieces of turns split by segment_shaping.py have approximate text/audio boundaries, leave them out of training
+skip_split_segments = True
+metadata_file = os.path.join(audio_folder, "metadata.json")
+if os.path.exists(metadata_file):
+    # Pair audio and transcripts through the metadata written by data_prep_for_ASR.py
+    with open(metadata_file, 'r') as f:
+        metadata = json.load(f)
+    data_pairs = [(os.path.basename(entry["audio"]), os.path.basename(entry["transcript"])) for entry in metadata
+                  if not (skip_split_segments and entry.get("split", False))]
+    data_pairs = [(audio_file, transcript_file) for audio_file, transcript_file in data_pairs
+                  if os.path.exists(os.path.join(audio_folder, audio_file))
+                  and os.path.exists(os.path.join(transcript_folder, transcript_file))]
+    print(f"Training on {len(data_pairs)} of {len(metadata)} segments listed in {metadata_file}")
+else:
+    data_pairs = list(zip(audio_files, transcript_files))
+
+def featurize_dataset():
+    data = []
+    for audio_file, transcript_file in data_pairs:
+        audio_path = os.path.join(audio_folder, audio_file)
+        transcript_path = os.path.join(transcript_folder, transcript_file)
+        audio, sr = librosa.load(audio_path, sr=16000)
+        with open(transcript_path, 'r') as f:
+            transcript = f.read().strip()
+        input_features = processor(audio, sampling_rate=16000, return_tensors="pt").input_features.squeeze(0)
+        labels = processor.tokenizer(transcript, return_tensors="pt").input_ids.squeeze(0)
+        data.append({"input_features": input_features.numpy().tolist(), "labels": labels.numpy().tolist()})
+
+    # Convert to Dataset object
+    return Dataset.from_dict({"input_features": [x["input_features"] for x in data], "labels": [x["labels"] for x in data]})
 
-# Convert to Dataset object
-full_dataset = Dataset.from_dict({"input_features": [x["input_features"] for x in data], "labels": [x["labels"] for x in data]})
+if fast_start:
+    # Reuse the features saved by an earlier run (memory mapped from disk) unless the data files or the revision changed,
+    # the processor (feature extractor + tokenizer) can differ between revisions
+    fingerprint = {"revision": whisper_commit, "files": data_fingerprint(audio_folder, transcript_folder), "pairs": [list(pair) for pair in data_pairs]}
+    fingerprint_file = os.path.join(features_cache_folder, "data_fingerprint.json")
+    cached_fingerprint = None
+    if os.path.exists(fingerprint_file):
+        with open(fingerprint_file, 'r') as f:
+            cached_fingerprint = json.load(f)
+
+    features_reused = cached_fingerprint == fingerprint
+    if features_reused:
+        full_dataset = load_from_disk(os.path.join(features_cache_folder, "dataset"))
+    else:
+        full_dataset = featurize_dataset()
+        os.makedirs(features_cache_folder, exist_ok=True)
+        full_dataset.save_to_disk(os.path.join(features_cache_folder, "dataset"))
+        with open(fingerprint_file, 'w') as f:
+            json.dump(fingerprint, f)
+else:
+    full_dataset = featurize_dataset()
 
 # Split the dataset into train and validation sets (e.g., 80% train, 20% validation)
 train_val_split = full_dataset.train_test_split(test_size=0.2, seed=42)  # Split 80-20 for train and validation
@@ -135,16 +279,13 @@ training_args = Seq2SeqTrainingArguments(
     load_best_model_at_end=True
 )
 
-# 6. Load Evaluation Metric
-wer_metric = load("wer")
-
+# 6. Evaluation Metric (compiled corpus level WER/CER, see wer_evaluation.py for per speaker and per case reports)
 def compute_metrics(pred):
     pred_ids = pred.predictions
     pred_str = processor.batch_decode(pred_ids, skip_special_tokens=True)
     label_ids = pred.label_ids
     label_str = processor.batch_decode(label_ids, skip_special_tokens=True)
-    wer = wer_metric.compute(predictions=pred_str, references=label_str)
-    return {"wer": wer}
+    return corpus_error_rates(label_str, pred_str)
 
 # 7. Initialize Custom Trainer
 trainer = CustomWhisperSeq2SeqTrainer(
@@ -154,11 +295,35 @@ trainer = CustomWhisperSeq2SeqTrainer(
     eval_dataset=eval_dataset,  # Use eval_dataset for validation during training
     tokenizer=processor.feature_extractor,
     data_collator=data_collator,
-    compute_metrics=compute_metrics
+    compute_metrics=compute_metrics,
+    callbacks=[StartupAndCheckpointCallback(script_start_time)]
 )
 
-# 8. Start Training and Save Checkpoints
-trainer.train()
+# 8. Start Training and Save Checkpoints (fast start resumes adapter + optimizer state from the last checkpoint)
+last_checkpoint = None
+if fast_start and resume_training and os.path.isdir(training_args.output_dir):
+    last_checkpoint = get_last_checkpoint(training_args.output_dir)
+    if last_checkpoint is not None and not features_reused:
+        print(f"Data or model revision changed since {last_checkpoint} was saved, training from scratch instead of resuming")
+        last_checkpoint = None
+
+finished = False
+if last_checkpoint is not None:
+    with open(os.path.join(last_checkpoint, "trainer_state.json"), 'r') as f:
+        checkpoint_state = json.load(f)
+    finished = checkpoint_state["global_step"] >= checkpoint_state["max_steps"]
+    if finished:
+        print(f"{last_checkpoint} already finished training (step {checkpoint_state['global_step']} of "
+              f"{checkpoint_state['max_steps']}), skipping training. Set resume_training = False to train again")
+    else:
+        print(f"Resuming from {last_checkpoint}")
+
+if finished:
+    # Load the trained adapter (best one, as with load_best_model_at_end) so the evaluation below uses it
+    adapter_checkpoint = checkpoint_state.get("best_model_checkpoint") or last_checkpoint
+    model.load_adapter(adapter_checkpoint, adapter_name="default")
+else:
+    trainer.train(resume_from_checkpoint=last_checkpoint)
 
 # 9. Evaluate the Model on Test Dataset
 eval_results = trainer.evaluate(eval_dataset=test_dataset)  # Evaluate on the test dataset
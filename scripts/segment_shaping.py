@@ -0,0 +1,196 @@
+############################################################################################################################
+############################################################################################################################
+'''
+Purpose : Shape the aligned speaker turns into segments that fit Whisper's 30 s input window before the audio is split,
+          so that long turns are not silently truncated by the feature extractor and short fragments do not waste a full
+          3000-frame (30 s) spectrogram of padding each.
+
+Steps :
+
+1. Speaker Turn Index: Builds an interval index (turns sorted by start time, with a running max of end times) over the
+   aligned JSON of a case, to look up which turns overlap any time range.
+2. Merge Turns: Merges adjacent turns of the same speaker up to `target_duration` seconds, as long as no other speaker
+   talks in between (checked with the index).
+3. Split Long Turns: Splits turns longer than `max_duration` seconds at the lowest energy point (RMS over 20 ms frames)
+   in the second half of the window. The transcript is split in proportion to the duration of each piece, so split pieces
+   are marked with "split": true (their text and audio boundaries are approximate) and pieces left without any words are
+   dropped. The hearing audio is only decoded for cases that have a turn to split.
+4. Padding Report: Reports how much of the compute budget (30 s per segment) goes to padding, and how much audio is
+   truncated, before and after shaping.
+
+Replace Paths :
+
+json_folder = "path_to_json_files"
+audio_folder = "path_to_audio_files which are silence removed and processed with noise removal"
+'''
+############################################################################################################################
+############################################################################################################################
+
+
+import os
+import json
+import bisect
+import numpy as np
+from pydub import AudioSegment
+
+# Whisper pads or truncates every input to 30 seconds (3000 frames of log-mel spectrogram)
+WHISPER_WINDOW = 30.0
+
+# Interval index over the turns of one case
+class SpeakerTurnIndex:
+    def __init__(self, turns):
+        self.turns = sorted(turns, key=lambda turn: turn["start_time"])
+        self.starts = [turn["start_time"] for turn in self.turns]
+        # Running max of end times, lets overlap queries stop scanning to the left early
+        self.max_ends = []
+        max_end = float("-inf")
+        for turn in self.turns:
+            max_end = max(max_end, turn["end_time"])
+            self.max_ends.append(max_end)
+
+    def overlapping(self, start_time, end_time):
+        """Returns the turns that overlap the range (start_time, end_time)."""
+        result = []
+        idx = bisect.bisect_left(self.starts, end_time) - 1
+        while idx >= 0 and self.max_ends[idx] > start_time:
+            turn = self.turns[idx]
+            if turn["end_time"] > start_time:
+                result.append(turn)
+            idx -= 1
+        return result[::-1]
+
+# Merge consecutive turns of the same speaker up to target_duration, if no other speaker talks in between
+def merge_turns(index, target_duration=25.0):
+    merged = []
+    for turn in index.turns:
+        if merged:
+            last = merged[-1]
+            same_speaker = last["real_speaker"] == turn["real_speaker"]
+            fits = max(last["end_time"], turn["end_time"]) - last["start_time"] <= target_duration
+            if same_speaker and fits:
+                between = index.overlapping(min(last["end_time"], turn["start_time"]), max(last["end_time"], turn["start_time"]))
+                if all(other["real_speaker"] == turn["real_speaker"] for other in between):
+                    last["end_time"] = max(last["end_time"], turn["end_time"])
+                    last["transcript"] = f"{last['transcript']} {turn['transcript']}".strip()
+                    continue
+        merged.append(dict(turn))
+    return merged
+
+# RMS energy of every 20 ms frame between start_time and end_time
+def frame_energies(audio, start_time, end_time, frame_ms=20):
+    segment = audio[int(start_time * 1000):int(end_time * 1000)]
+    samples = np.array(segment.get_array_of_samples(), dtype=np.float64)
+    if segment.channels > 1:
+        samples = samples.reshape(-1, segment.channels).mean(axis=1)
+    frame_length = max(1, int(segment.frame_rate * frame_ms / 1000))
+    num_frames = len(samples) // frame_length
+    frames = samples[:num_frames * frame_length].reshape(num_frames, frame_length)
+    return np.sqrt((frames ** 2).mean(axis=1)), frame_ms / 1000
+
+# Split point for a turn that starts at start_time: lowest energy point between half and the full max_duration
+def find_split_point(audio, start_time, max_duration):
+    window_start = start_time + max_duration / 2
+    window_end = start_time + max_duration
+    if audio is None:
+        return window_end
+    energies, frame_seconds = frame_energies(audio, window_start, window_end)
+    if len(energies) == 0:
+        return window_end
+    # Take the last minimum so that flat energy (no pause in the window) still gives the longest piece
+    quietest_frame = len(energies) - 1 - int(np.argmin(energies[::-1]))
+    return window_start + (quietest_frame + 0.5) * frame_seconds
+
+# Split turns longer than max_duration, dividing the transcript words in proportion to the duration of each piece.
+# load_audio is called (once) only when a turn actually needs splitting, without it turns are cut at max_duration
+def split_long_turns(turns, load_audio=None, max_duration=WHISPER_WINDOW):
+    shaped = []
+    audio = None
+    for turn in turns:
+        start_time = turn["start_time"]
+        end_time = turn["end_time"]
+        if end_time - start_time <= max_duration:
+            shaped.append(turn)
+            continue
+
+        if audio is None and load_audio is not None:
+            audio = load_audio()
+
+        cut_points = [start_time]
+        while end_time - cut_points[-1] > max_duration:
+            cut_points.append(find_split_point(audio, cut_points[-1], max_duration))
+        cut_points.append(end_time)
+
+        words = turn["transcript"].split()
+        word_cuts = [round(len(words) * (cut - start_time) / (end_time - start_time)) for cut in cut_points]
+        for piece_start, piece_end, first_word, last_word in zip(cut_points, cut_points[1:], word_cuts, word_cuts[1:]):
+            # A piece without words would become an audio segment with an empty label
+            if first_word == last_word:
+                continue
+            piece = dict(turn)
+            piece["start_time"] = piece_start
+            piece["end_time"] = piece_end
+            piece["transcript"] = " ".join(words[first_word:last_word])
+            piece["split"] = True
+            shaped.append(piece)
+    return shaped
+
+def shape_segments(aligned_data, load_audio=None, target_duration=25.0, max_duration=WHISPER_WINDOW):
+    """Merges short same-speaker turns and splits over-long turns of one case, returns turns in the aligned JSON format."""
+    index = SpeakerTurnIndex(aligned_data)
+    merged = merge_turns(index, target_duration)
+    return split_long_turns(merged, load_audio, max_duration)
+
+def padding_report(segments, window=WHISPER_WINDOW):
+    """How much of the fixed 30 s input per segment is padding, and how much audio gets truncated."""
+    # Rounded to milliseconds so pieces cut at exactly max_duration are not counted as truncated
+    durations = [max(0.0, round(segment["end_time"] - segment["start_time"], 3)) for segment in segments]
+    budget = len(durations) * window
+    padded = sum(max(0.0, window - duration) for duration in durations)
+    truncated = sum(max(0.0, duration - window) for duration in durations)
+    return {
+        "segments": len(durations),
+        "audio_seconds": sum(durations),
+        "padding_seconds": padded,
+        "padding_fraction": padded / budget if budget > 0 else 0.0,
+        "truncated_seconds": truncated,
+        "truncated_segments": sum(duration > window for duration in durations),
+        "sub_second_segments": sum(duration < 1.0 for duration in durations)
+    }
+
+def print_padding_report(name, report):
+    print(f"{name}: {report['segments']} segments, {report['audio_seconds']:.1f}s audio, "
+          f"{100 * report['padding_fraction']:.1f}% of compute is padding, "
+          f"{report['truncated_seconds']:.1f}s truncated in {report['truncated_segments']} segments, "
+          f"{report['sub_second_segments']} sub-second segments")
+
+def shape_all_files(json_folder, audio_folder=None, target_duration=25.0, max_duration=WHISPER_WINDOW):
+    """Shapes every aligned JSON in json_folder and prints the padding report before and after shaping."""
+    before = []
+    after = []
+    shaped_cases = {}
+    for json_file in sorted(os.listdir(json_folder)):
+        if json_file.endswith(".json"):
+            base_name = json_file.replace(".json", "")
+            with open(os.path.join(json_folder, json_file), 'r') as f:
+                aligned_data = json.load(f)
+
+            load_audio = None
+            if audio_folder is not None:
+                audio_file = os.path.join(audio_folder, base_name + ".wav")
+                load_audio = lambda: AudioSegment.from_wav(audio_file)
+
+            shaped = shape_segments(aligned_data, load_audio, target_duration, max_duration)
+            before.extend(aligned_data)
+            after.extend(shaped)
+            shaped_cases[base_name] = shaped
+
+    print_padding_report("Before shaping", padding_report(before))
+    print_padding_report("After shaping", padding_report(after))
+    return shaped_cases
+
+
+if __name__ == "__main__":
+    json_folder = 'final_output_json'
+    audio_folder = 'original_audio_folder'
+
+    shape_all_files(json_folder, audio_folder)
@@ -0,0 +1,278 @@
+############################################################################################################################
+############################################################################################################################
+'''
+Purpose : Score Whisper predictions against the reference transcripts at corpus level (WER and CER) and break the errors
+          down by speaker and by case, so we can see where the model fails (judges vs counsel, particular hearings).
+
+Steps :
+
+1. Tokenize Once: Every reference and hypothesis is split into words (mapped to integer ids through one shared vocabulary)
+   and into characters (unicode code points), and packed into flat integer arrays with per-segment offsets.
+2. Compiled Edit Distance: A numba compiled Levenshtein with backtrace counts substitutions, insertions and deletions for
+   every segment. Segments are scored in parallel across CPU cores (numba `prange`).
+3. Incremental Scoring: Per-segment counts are cached on disk keyed by a hash of (reference, hypothesis), so scoring a new
+   checkpoint only rescores the segments whose prediction changed.
+4. Breakdown: Counts are summed per speaker (from `metadata.json`) and per case (from the segment file name) and written
+   to a JSON report along with the overall numbers.
+
+The predictions file is a JSON dictionary mapping the segment audio file name (e.g. "<case>_segment_0.wav") to the
+transcript predicted by the model.
+
+Replace Paths :
+
+metadata_file = "path_to_metadata.json created by data_prep_for_ASR.py"
+segments_folder = "path_to_folder_with_segment_transcripts"
+predictions_file = "path_to_predictions_json"
+cache_file = "path_to_scoring_cache_json"
+report_file = "path_to_save_evaluation_report"
+
+To know how many CPU cores you have, run this command - "sysctl -n hw.ncpu" and the adjust the parameter num_workers based on that
+'''
+############################################################################################################################
+############################################################################################################################
+
+
+import os
+import re
+import json
+import hashlib
+import numpy as np
+from numba import njit, prange, set_num_threads, config as numba_config
+
+# Levenshtein distance with backtrace between two integer token sequences, returns (substitutions, insertions, deletions)
+@njit(cache=True)
+def edit_operations(ref, hyp):
+    n = len(ref)
+    m = len(hyp)
+    dist = np.empty((n + 1, m + 1), dtype=np.int32)
+    for i in range(n + 1):
+        dist[i, 0] = i
+    for j in range(m + 1):
+        dist[0, j] = j
+
+    for i in range(1, n + 1):
+        for j in range(1, m + 1):
+            cost = 0 if ref[i - 1] == hyp[j - 1] else 1
+            best = dist[i - 1, j - 1] + cost
+            if dist[i - 1, j] + 1 < best:
+                best = dist[i - 1, j] + 1
+            if dist[i, j - 1] + 1 < best:
+                best = dist[i, j - 1] + 1
+            dist[i, j] = best
+
+    # Walk back through the matrix to split the distance into substitutions, insertions and deletions
+    substitutions = 0
+    insertions = 0
+    deletions = 0
+    i = n
+    j = m
+    while i > 0 or j > 0:
+        if i > 0 and j > 0:
+            cost = 0 if ref[i - 1] == hyp[j - 1] else 1
+            if dist[i, j] == dist[i - 1, j - 1] + cost:
+                substitutions += cost
+                i -= 1
+                j -= 1
+                continue
+        if i > 0 and dist[i, j] == dist[i - 1, j] + 1:
+            deletions += 1
+            i -= 1
+        else:
+            insertions += 1
+            j -= 1
+    return substitutions, insertions, deletions
+
+# Score all the packed segments in parallel, returns an (n_segments, 4) array of [substitutions, insertions, deletions, ref_length]
+@njit(parallel=True, cache=True)
+def batch_edit_operations(ref_ids, ref_offsets, hyp_ids, hyp_offsets):
+    num_segments = len(ref_offsets) - 1
+    counts = np.zeros((num_segments, 4), dtype=np.int64)
+    for k in prange(num_segments):
+        ref = ref_ids[ref_offsets[k]:ref_offsets[k + 1]]
+        hyp = hyp_ids[hyp_offsets[k]:hyp_offsets[k + 1]]
+        substitutions, insertions, deletions = edit_operations(ref, hyp)
+        counts[k, 0] = substitutions
+        counts[k, 1] = insertions
+        counts[k, 2] = deletions
+        counts[k, 3] = len(ref)
+    return counts
+
+# Concatenate the token id sequences into one flat array with offsets, so numba can work on plain arrays
+def pack_sequences(sequences):
+    offsets = np.zeros(len(sequences) + 1, dtype=np.int64)
+    for idx, sequence in enumerate(sequences):
+        offsets[idx + 1] = offsets[idx] + len(sequence)
+    flat = np.zeros(offsets[-1], dtype=np.int32)
+    for idx, sequence in enumerate(sequences):
+        flat[offsets[idx]:offsets[idx + 1]] = sequence
+    return flat, offsets
+
+# Map words to integer ids using one vocabulary shared by references and hypotheses
+def word_ids(texts, vocabulary):
+    return [np.array([vocabulary.setdefault(word, len(vocabulary)) for word in text.split()], dtype=np.int32) for text in texts]
+
+# Characters are scored as unicode code points, with whitespace collapsed to single spaces
+def char_ids(texts):
+    return [np.frombuffer(" ".join(text.split()).encode("utf-32-le"), dtype=np.uint32).astype(np.int32) for text in texts]
+
+def score_pairs(references, hypotheses, num_workers=None):
+    """Returns per segment word level and character level counts of [substitutions, insertions, deletions, ref_length]."""
+    if len(references) != len(hypotheses):
+        raise ValueError(f"Got {len(references)} references but {len(hypotheses)} hypotheses")
+    if num_workers is not None:
+        # numba refuses more threads than it was started with (the number of CPU cores by default)
+        set_num_threads(max(1, min(num_workers, numba_config.NUMBA_NUM_THREADS)))
+
+    vocabulary = {}
+    ref_words, ref_word_offsets = pack_sequences(word_ids(references, vocabulary))
+    hyp_words, hyp_word_offsets = pack_sequences(word_ids(hypotheses, vocabulary))
+    ref_chars, ref_char_offsets = pack_sequences(char_ids(references))
+    hyp_chars, hyp_char_offsets = pack_sequences(char_ids(hypotheses))
+
+    word_counts = batch_edit_operations(ref_words, ref_word_offsets, hyp_words, hyp_word_offsets)
+    char_counts = batch_edit_operations(ref_chars, ref_char_offsets, hyp_chars, hyp_char_offsets)
+    return word_counts, char_counts
+
+# Turn summed [substitutions, insertions, deletions, ref_length] counts into an error rate summary
+def summarize_counts(counts):
+    substitutions, insertions, deletions, ref_length = (int(value) for value in counts)
+    errors = substitutions + insertions + deletions
+    return {
+        "rate": errors / ref_length if ref_length > 0 else float(errors > 0),
+        "substitutions": substitutions,
+        "insertions": insertions,
+        "deletions": deletions,
+        "reference_length": ref_length
+    }
+
+def corpus_error_rates(references, hypotheses, num_workers=None):
+    """Corpus level WER and CER for two lists of strings, drop in replacement for the `evaluate` wer metric."""
+    word_counts, char_counts = score_pairs(references, hypotheses, num_workers)
+    word_summary = summarize_counts(word_counts.sum(axis=0))
+    char_summary = summarize_counts(char_counts.sum(axis=0))
+    return {
+        "wer": word_summary["rate"],
+        "cer": char_summary["rate"],
+        "substitutions": word_summary["substitutions"],
+        "insertions": word_summary["insertions"],
+        "deletions": word_summary["deletions"]
+    }
+
+# Case name is the segment file name without the "_segment_<idx>" suffix added by data_prep_for_ASR.py
+def case_name_from_segment(audio_path):
+    base_name = os.path.splitext(os.path.basename(audio_path))[0]
+    return re.sub(r"_segment_\d+$", "", base_name)
+
+def segment_digest(reference, hypothesis):
+    return hashlib.sha1((reference + "\0" + hypothesis).encode("utf-8")).hexdigest()
+
+def load_scoring_cache(cache_file):
+    if cache_file and os.path.exists(cache_file):
+        with open(cache_file, "r") as f:
+            return json.load(f)
+    return {}
+
+# Write to a temporary file first so an interrupted run never leaves a half written cache
+def save_scoring_cache(cache_file, cache):
+    with open(cache_file + ".tmp", "w") as f:
+        json.dump(cache, f)
+    os.replace(cache_file + ".tmp", cache_file)
+
+def evaluate_predictions(metadata_file, predictions, segments_folder=None, cache_file=None, num_workers=None):
+    """Scores predictions for the segments listed in metadata.json and reports WER/CER overall, per speaker and per case."""
+    with open(metadata_file, "r") as f:
+        metadata = json.load(f)
+
+    # Segments no longer in metadata.json are dropped so the cache does not grow across datasets
+    segment_keys = {os.path.basename(entry["audio"]) for entry in metadata}
+    cache = {key: value for key, value in load_scoring_cache(cache_file).items() if key in segment_keys}
+
+    segments = []
+    for entry in metadata:
+        segment_key = os.path.basename(entry["audio"])
+        if segment_key not in predictions:
+            continue
+
+        # metadata.json stores paths relative to where data_prep_for_ASR.py was run, so resolve them against segments_folder
+        transcript_path = entry["transcript"]
+        if segments_folder is not None:
+            transcript_path = os.path.join(segments_folder, os.path.basename(transcript_path))
+        with open(transcript_path, "r") as f:
+            reference = f.read().strip()
+
+        hypothesis = predictions[segment_key].strip()
+        segments.append({
+            "key": segment_key,
+            "speaker": entry["speaker"],
+            "case": case_name_from_segment(segment_key),
+            "reference": reference,
+            "hypothesis": hypothesis,
+            "digest": segment_digest(reference, hypothesis)
+        })
+
+    # Only rescore the segments whose reference or prediction changed since the cached run
+    stale = [segment for segment in segments if cache.get(segment["key"], {}).get("digest") != segment["digest"]]
+    if stale:
+        word_counts, char_counts = score_pairs([s["reference"] for s in stale], [s["hypothesis"] for s in stale], num_workers)
+        for segment, word_count, char_count in zip(stale, word_counts, char_counts):
+            cache[segment["key"]] = {
+                "digest": segment["digest"],
+                "word": word_count.tolist(),
+                "char": char_count.tolist()
+            }
+    print(f"Scored {len(stale)} changed segments, reused {len(segments) - len(stale)} cached segments")
+
+    if cache_file:
+        save_scoring_cache(cache_file, cache)
+
+    # Sum the counts per group and turn them into rates
+    totals = {"overall": {}, "by_speaker": {}, "by_case": {}}
+    for segment in segments:
+        counts = cache[segment["key"]]
+        for group, name in (("overall", "all"), ("by_speaker", segment["speaker"]), ("by_case", segment["case"])):
+            group_totals = totals[group].setdefault(name, {"word": np.zeros(4, dtype=np.int64), "char": np.zeros(4, dtype=np.int64), "segments": 0})
+            group_totals["word"] += counts["word"]
+            group_totals["char"] += counts["char"]
+            group_totals["segments"] += 1
+
+    report = {}
+    for group, names in totals.items():
+        report[group] = {
+            name: {
+                "segments": group_totals["segments"],
+                "wer": summarize_counts(group_totals["word"]),
+                "cer": summarize_counts(group_totals["char"])
+            }
+            for name, group_totals in names.items()
+        }
+    report["overall"] = report["overall"].get("all", {})
+    return report
+
+def print_report(report):
+    overall = report["overall"]
+    if overall:
+        print(f"Overall: WER {overall['wer']['rate']:.4f} | CER {overall['cer']['rate']:.4f} | {overall['segments']} segments")
+    for group in ("by_speaker", "by_case"):
+        print(f"\n{group}:")
+        # Worst groups first, that is where the fine-tuning needs attention
+        for name, result in sorted(report[group].items(), key=lambda item: -item[1]["wer"]["rate"]):
+            wer = result["wer"]
+            print(f"  {name}: WER {wer['rate']:.4f} (S={wer['substitutions']}, I={wer['insertions']}, D={wer['deletions']}) "
+                  f"| CER {result['cer']['rate']:.4f} | {result['segments']} segments")
+
+
+if __name__ == "__main__":
+    metadata_file = 'ASR_data/metadata.json'
+    segments_folder = 'ASR_data'
+    predictions_file = 'predictions.json'
+    cache_file = 'wer_cache.json'
+    report_file = 'evaluation.json'
+
+    with open(predictions_file, 'r') as f:
+        predictions = json.load(f)
+
+    report = evaluate_predictions(metadata_file, predictions, segments_folder, cache_file, num_workers=4)
+    print_report(report)
+
+    with open(report_file, 'w') as f:
+        json.dump(report, f, indent=4)